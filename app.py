@@ -1,8 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import math
 from typing import Literal
 
-from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, status
+from fastapi import FastAPI, HTTPException, Query, status
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel, Field
 
@@ -12,8 +13,9 @@ from database import (
     get_all_topic_specifications_or_raise,
     get_all_topics_or_raise,
     get_tag_specification,
+    get_tag_specifications,
 )
-from forecast_db import run_migrations, select_available_forecasts, select_points
+from forecast_db import run_migrations, select_available_forecasts, select_points, warm_pool
 from jobs.generate_forecasts import _build_rows_for_topic, run_fixation
 from jobs.history_service import history_job_service
 from radiation import calculate_panel_irradiance
@@ -22,6 +24,9 @@ from weather_service import get_weather_for_date
 settings = load_settings()
 app = FastAPI()
 
+# Shared across requests: /predict/runtime work is blocking weather I/O, so threads are reused instead of spawned per call.
+_RUNTIME_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="predict-runtime")
+
 
 class PredictRequest(BaseModel):
     prediction_date: str = Field(..., description="Дата във формат YYYY-MM-DD")
@@ -138,6 +143,14 @@ class ClearSkyRadiationResponse(BaseModel):
 @app.on_event("startup")
 def startup() -> None:
     run_migrations()
+    history_job_service.fail_interrupted_jobs()
+    warm_pool()
+
+
+@app.on_event("shutdown")
+def shutdown() -> None:
+    history_job_service.shutdown()
+    _RUNTIME_EXECUTOR.shutdown(wait=True)
 
 
 @app.get("/forecasts/available", response_model=AvailableForecastsResponse)
@@ -182,6 +195,29 @@ def predict(request: PredictRequest) -> PredictResponse:
     return PredictResponse(mode="cache", points=select_points(request.topics, day_start, day_end))
 
 
+def _runtime_points_for_topic(topic: str, spec: dict, day_start: datetime, day_end: datetime) -> list[PredictionPoint]:
+    uid = spec.get("sm_user_object_id")
+    lat = spec.get("latitude")
+    lon = spec.get("longitude")
+    if uid is None or lat is None or lon is None:
+        return []
+
+    rid = spec.get("replicator_id")
+    weather_result = get_weather_for_date(
+        replicator_id=rid,
+        user_object_id=int(uid),
+        latitude=float(lat),
+        longitude=float(lon),
+        prediction_date=day_start.date(),
+    )
+    rows = _build_rows_for_topic(topic, weather_result.records, weather_result.source, spec=spec)
+    return [
+        PredictionPoint(x=ts.strftime("%Y-%m-%d %H:%M"), y=power)
+        for _, ts, power, _source in rows
+        if day_start <= ts < day_end
+    ]
+
+
 @app.post("/predict/runtime", response_model=PredictResponse)
 def predict_runtime(request: PredictRequest) -> PredictResponse:
     if len(request.topics) > settings.max_topics_per_request:
@@ -194,41 +230,28 @@ def predict_runtime(request: PredictRequest) -> PredictResponse:
 
     day_end = day_start + timedelta(days=1)
     points: dict[str, list[PredictionPoint]] = {topic: [] for topic in request.topics}
-
-    for topic in request.topics:
-        spec = get_tag_specification(topic)
-        if not spec:
-            continue
-
-        uid = spec.get("sm_user_object_id")
-        lat = spec.get("latitude")
-        lon = spec.get("longitude")
-        if uid is None or lat is None or lon is None:
-            continue
-
-        rid = spec.get("replicator_id")
-        weather_result = get_weather_for_date(
-            replicator_id=rid,
-            user_object_id=int(uid),
-            latitude=float(lat),
-            longitude=float(lon),
-            prediction_date=day_start.date(),
-        )
-        rows = _build_rows_for_topic(topic, weather_result["records"], weather_result["source"])
-        points[topic] = [
-            PredictionPoint(x=ts.strftime("%Y-%m-%d %H:%M"), y=power)
-            for _, ts, power, _source in rows
-            if day_start <= ts < day_end
-        ]
+    if not request.topics:
+        return PredictResponse(mode="recompute", points=points)
+
+    specs = get_tag_specifications(request.topics)
+    # Each topic is dominated by blocking weather I/O (archive DB / WeatherAPI), so overlap them.
+    futures = {
+        _RUNTIME_EXECUTOR.submit(_runtime_points_for_topic, topic, spec, day_start, day_end): topic
+        for topic, spec in specs.items()
+    }
+    try:
+        for future in as_completed(futures):
+            points[futures[future]] = future.result()
+    finally:
+        # Don't leave queued topics of a failed request occupying the shared pool.
+        for future in futures:
+            future.cancel()
 
     return PredictResponse(mode="recompute", points=points)
 
 
 @app.post("/jobs/generate-history", response_model=GenerateHistoryResponse, status_code=status.HTTP_202_ACCEPTED)
-def generate_history_job(
-    payload: GenerateHistoryRequest,
-    background_tasks: BackgroundTasks,
-) -> GenerateHistoryResponse:
+def generate_history_job(payload: GenerateHistoryRequest) -> GenerateHistoryResponse:
     days = payload.days if payload.days is not None else settings.forecast_history_days
     if days < 1:
         raise HTTPException(status_code=400, detail="days трябва да е положително число.")
@@ -237,20 +260,18 @@ def generate_history_job(
     job = creation["job"]
 
     if creation["started"]:
-        background_tasks.add_task(history_job_service.run_job, job["id"])
+        history_job_service.enqueue_run(job["id"])
 
     return GenerateHistoryResponse(started=creation["started"], job=JobResponse(**job))
 
 
 @app.post("/jobs/fix-yesterday", response_model=GenerateHistoryResponse, status_code=status.HTTP_202_ACCEPTED)
-def fix_yesterday_job(
-    background_tasks: BackgroundTasks,
-) -> GenerateHistoryResponse:
+def fix_yesterday_job() -> GenerateHistoryResponse:
     creation = history_job_service.create_job(days=1)
     job = creation["job"]
 
     if creation["started"]:
-        background_tasks.add_task(history_job_service.run_fixation_job, job["id"])
+        history_job_service.enqueue_fixation(job["id"])
 
     return GenerateHistoryResponse(started=creation["started"], job=JobResponse(**job))
 
@@ -315,7 +336,7 @@ def weather_info(request: WeatherInfoRequest) -> WeatherInfoResponse:
     )
 
     sanitized_points: list[WeatherPoint] = []
-    for rec in weather_result["records"]:
+    for rec in weather_result.records:
         cloud_value = rec.get("cloud")
         cloud_int: int | None
         if cloud_value is None:
@@ -347,10 +368,10 @@ def weather_info(request: WeatherInfoRequest) -> WeatherInfoResponse:
         )
 
     return WeatherInfoResponse(
-        source=weather_result["source"],
-        status=weather_result["status"],
+        source=weather_result.source,
+        status=weather_result.status,
         points=sanitized_points,
-        diagnostics=weather_result.get("diagnostics"),
+        diagnostics=weather_result.diagnostics,
     )
 
 @app.post("/radiation/clear-sky", response_model=ClearSkyRadiationResponse)
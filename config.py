@@ -30,6 +30,10 @@ class Settings:
     weather_api_key: str
     model_version: str
     max_topics_per_request: int
+    forecast_workers: int
+    db_pool_size: int
+    db_max_overflow: int
+    weather_cache_path: str | None
 
 
 def load_settings() -> Settings:
@@ -46,4 +50,23 @@ def load_settings() -> Settings:
         weather_api_key=_required("WEATHER_API_KEY"),
         model_version=_required("MODEL_VERSION"),
         max_topics_per_request=_int_from_env("MAX_TOPICS_PER_REQUEST", default=1000),
+        forecast_workers=_int_from_env("FORECAST_WORKERS", default=1),
+        db_pool_size=_int_from_env("DB_POOL_SIZE", default=20),
+        db_max_overflow=_int_from_env("DB_MAX_OVERFLOW", default=10),
+        weather_cache_path=os.getenv("WEATHER_CACHE_PATH") or None,
     )
+
+
+def engine_options(settings: Settings) -> dict:
+    """Common create_engine() keyword arguments for the PostgreSQL engines."""
+    return {
+        "pool_pre_ping": True,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        # Recycle before server/firewall idle timeouts; LIFO keeps a small set of connections hot.
+        "pool_recycle": 1800,
+        "pool_use_lifo": True,
+        # Pin the session to UTC: naive timestamps and DATE keys are UTC throughout, including the generated
+        # pv_forecast_points.day column, so they must not shift with the server's timezone setting.
+        "connect_args": {"application_name": "td_pv", "options": "-c timezone=UTC"},
+    }
@@ -1,38 +1,121 @@
 import logging
+from threading import Lock
 
 import pandas as pd
+from cachetools import TTLCache
 from sqlalchemy import create_engine, text
 
-from config import load_settings
+from config import engine_options, load_settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 settings = load_settings()
-engine_spec = create_engine(settings.archive_db_dsn, pool_pre_ping=True)
+engine_spec = create_engine(settings.archive_db_dsn, **engine_options(settings))
+
+# Specifications change rarely; cache lookups (including misses) for a few minutes.
+_tag_spec_cache: TTLCache = TTLCache(maxsize=1024, ttl=600)
+_tag_spec_cache_lock = Lock()
+
+
+_TAG_SPEC_QUERY = text("SELECT * FROM tag_specification WHERE tag = :topic LIMIT 1")
+_TAG_SPECS_QUERY = text("SELECT * FROM tag_specification WHERE tag = ANY(:topics)")
+_TOPICS_QUERY = text("SELECT tag FROM tag_specification WHERE tag IS NOT NULL")
+_DISTINCT_TOPICS_QUERY = text(
+    """
+    SELECT DISTINCT tag
+    FROM tag_specification
+    WHERE tag IS NOT NULL
+    ORDER BY tag
+    """
+)
+_TOPIC_SPECS_QUERY = text(
+    """
+    SELECT
+        tag,
+        sm_user_object_id,
+        replicator_id,
+        latitude,
+        longitude,
+        tilt,
+        azimuth,
+        module_length,
+        module_width,
+        module_efficiency,
+        total_panels
+    FROM tag_specification
+    WHERE tag IS NOT NULL
+    ORDER BY tag
+    """
+)
 
 
 class DatabaseReadError(RuntimeError):
     """Raised when we cannot read data from the archive DB."""
 
 
+def _spec_records(df: pd.DataFrame) -> list[dict]:
+    """Rows as dicts with NULLs as None; pandas gives NaN/NaT for them once a frame has more than one row."""
+    df = df.astype(object).where(df.notna(), None)
+    return [df.iloc[i].to_dict() for i in range(len(df))]
+
+
 def get_tag_specification(topic: str) -> dict | None:
+    with _tag_spec_cache_lock:
+        if topic in _tag_spec_cache:
+            spec = _tag_spec_cache[topic]
+            return dict(spec) if spec is not None else None
+
     try:
         with engine_spec.connect() as conn:
-            query = text("SELECT * FROM tag_specification WHERE tag = :topic LIMIT 1")
-            df = pd.read_sql(query, conn, params={"topic": topic})
-        if df.empty:
-            return None
-        return df.iloc[0].to_dict()
+            df = pd.read_sql(_TAG_SPEC_QUERY, conn, params={"topic": topic})
     except Exception as exc:
         logger.error("Error retrieving specification for topic '%s': %s", topic, exc)
         return None
 
+    spec = None if df.empty else _spec_records(df.iloc[:1])[0]
+    with _tag_spec_cache_lock:
+        _tag_spec_cache[topic] = spec
+    return dict(spec) if spec is not None else None
+
+
+def get_tag_specifications(topics: list[str]) -> dict[str, dict]:
+    """Bulk get_tag_specification: one query for all topics not in the cache.
+
+    Topics without a specification (or that failed to load) are absent from the result.
+    """
+    specs: dict[str, dict | None] = {}
+    with _tag_spec_cache_lock:
+        for topic in topics:
+            if topic in _tag_spec_cache:
+                specs[topic] = _tag_spec_cache[topic]
+
+    missing = [topic for topic in dict.fromkeys(topics) if topic not in specs]
+    if missing:
+        try:
+            with engine_spec.connect() as conn:
+                df = pd.read_sql(_TAG_SPECS_QUERY, conn, params={"topics": missing})
+        except Exception as exc:
+            logger.error("Error retrieving specifications for %d topics: %s", len(missing), exc)
+            df = None
+
+        if df is not None:
+            # First row per tag, converted exactly like the single-row lookup.
+            df = df.drop_duplicates(subset="tag", keep="first")
+            fetched = {spec["tag"]: spec for spec in _spec_records(df)}
+            with _tag_spec_cache_lock:
+                for topic in missing:
+                    spec = fetched.get(topic)
+                    _tag_spec_cache[topic] = spec
+                    specs[topic] = spec
+
+    return {topic: dict(spec) for topic, spec in specs.items() if spec is not None}
+
 
 def get_all_topics() -> list[str]:
     try:
         with engine_spec.connect() as conn:
-            rows = conn.execute(text("SELECT tag FROM tag_specification WHERE tag IS NOT NULL")).fetchall()
+            rows = conn.execute(_TOPICS_QUERY).fetchall()
         return [row[0] for row in rows]
     except Exception as exc:
         logger.error("Error reading topics from tag_specification: %s", exc)
@@ -42,16 +125,7 @@ def get_all_topics() -> list[str]:
 def get_all_topics_or_raise() -> list[str]:
     try:
         with engine_spec.connect() as conn:
-            rows = conn.execute(
-                text(
-                    """
-                    SELECT DISTINCT tag
-                    FROM tag_specification
-                    WHERE tag IS NOT NULL
-                    ORDER BY tag
-                    """
-                )
-            ).fetchall()
+            rows = conn.execute(_DISTINCT_TOPICS_QUERY).fetchall()
         return [row[0] for row in rows]
     except Exception as exc:
         logger.error("Error reading topics from tag_specification: %s", exc)
@@ -61,27 +135,7 @@ def get_all_topics_or_raise() -> list[str]:
 def get_all_topic_specifications_or_raise() -> list[dict]:
     try:
         with engine_spec.connect() as conn:
-            rows = conn.execute(
-                text(
-                    """
-                    SELECT
-                        tag,
-                        sm_user_object_id,
-                        replicator_id,
-                        latitude,
-                        longitude,
-                        tilt,
-                        azimuth,
-                        module_length,
-                        module_width,
-                        module_efficiency,
-                        total_panels
-                    FROM tag_specification
-                    WHERE tag IS NOT NULL
-                    ORDER BY tag
-                    """
-                )
-            ).mappings().all()
+            rows = conn.execute(_TOPIC_SPECS_QUERY).mappings().all()
         return [dict(row) for row in rows]
     except Exception as exc:
         logger.error("Error reading topic specifications: %s", exc)
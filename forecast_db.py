@@ -1,15 +1,43 @@
 from __future__ import annotations
 
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from typing import Sequence
 
-from psycopg2.extras import execute_values
-from sqlalchemy import create_engine, text
+from sqlalchemy import Column, DateTime, Float, MetaData, Table, Text, create_engine, func, text
+from sqlalchemy.dialects.postgresql import insert
 
-from config import load_settings
+from config import engine_options, load_settings
 
 settings = load_settings()
-engine = create_engine(settings.forecast_db_dsn, pool_pre_ping=True)
+# psycopg2 executemany goes through multi-row VALUES (INSERT) / execute_batch (UPDATE, DELETE).
+engine = create_engine(
+    settings.forecast_db_dsn,
+    **engine_options(settings),
+    executemany_mode="values_plus_batch",
+    insertmanyvalues_page_size=10000,
+    executemany_batch_page_size=500,
+)
+
+metadata = MetaData()
+pv_forecast_points = Table(
+    "pv_forecast_points",
+    metadata,
+    Column("topic", Text, primary_key=True),
+    Column("ts", DateTime(timezone=True), primary_key=True),
+    Column("power", Float, nullable=False),
+    Column("source", Text, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+)
+
+_insert_points = insert(pv_forecast_points)
+_UPSERT_POINTS = _insert_points.on_conflict_do_update(
+    index_elements=[pv_forecast_points.c.topic, pv_forecast_points.c.ts],
+    set_={
+        "power": _insert_points.excluded.power,
+        "source": _insert_points.excluded.source,
+        "created_at": func.now(),
+    },
+)
 
 
 def run_migrations() -> None:
@@ -25,10 +53,132 @@ def run_migrations() -> None:
 
     CREATE INDEX IF NOT EXISTS idx_pv_forecast_topic_ts
     ON pv_forecast_points (topic, ts);
+
+    -- Tiny range index for topic-less time scans (availability, retention deletes) on append-only data.
+    CREATE INDEX IF NOT EXISTS brin_pv_forecast_ts
+    ON pv_forecast_points USING BRIN (ts) WITH (pages_per_range = 32);
+
+    CREATE TABLE IF NOT EXISTS pv_forecast_jobs (
+        id TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        days INTEGER NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        started_at TIMESTAMPTZ,
+        finished_at TIMESTAMPTZ,
+        error TEXT,
+        owner TEXT,
+        heartbeat_at TIMESTAMPTZ
+    );
+
+    -- At most one queued/running job, no matter which API worker created it.
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_pv_forecast_jobs_active
+    ON pv_forecast_jobs ((true))
+    WHERE state IN ('queued', 'running');
     """
     with engine.begin() as conn:
         conn.execute(text(ddl))
+        conn.execute(text("ALTER TABLE pv_forecast_jobs ADD COLUMN IF NOT EXISTS owner TEXT"))
+        conn.execute(text("ALTER TABLE pv_forecast_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ"))
         conn.execute(text("ALTER TABLE pv_forecast_points ADD COLUMN IF NOT EXISTS source TEXT NOT NULL DEFAULT 'unknown'"))
+        # Indexed calendar day; AT TIME ZONE 'UTC' keeps the expression immutable and equal to DATE(ts) on the UTC
+        # session that engine_options() pins.
+        conn.execute(
+            text(
+                "ALTER TABLE pv_forecast_points "
+                "ADD COLUMN IF NOT EXISTS day DATE GENERATED ALWAYS AS ((ts AT TIME ZONE 'UTC')::date) STORED"
+            )
+        )
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_pv_forecast_topic_day ON pv_forecast_points (topic, day)"))
+        # Per topic/day point counts for /forecasts/available, maintained by the write functions below for the
+        # (topic, day) pairs they touch. Older deployments had a materialized view under the same name.
+        relkind = conn.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass('pv_forecast_points_daily')")
+        ).scalar()
+        if relkind != "r":
+            if relkind == "m":
+                conn.execute(text("DROP MATERIALIZED VIEW pv_forecast_points_daily"))
+            conn.execute(
+                text(
+                    """
+                    CREATE TABLE IF NOT EXISTS pv_forecast_points_daily (
+                        topic TEXT NOT NULL,
+                        day DATE NOT NULL,
+                        points_count BIGINT NOT NULL,
+                        PRIMARY KEY (topic, day)
+                    )
+                    """
+                )
+            )
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO pv_forecast_points_daily (topic, day, points_count)
+                    SELECT topic, day, count(*)
+                    FROM pv_forecast_points
+                    GROUP BY topic, day
+                    ON CONFLICT (topic, day) DO NOTHING
+                    """
+                )
+            )
+
+
+# Recount only the given (topic, day) pairs through idx_pv_forecast_topic_day; pairs left without points are removed.
+_RECOUNT_DAILY_QUERY = text(
+    """
+    WITH keys AS (
+        SELECT DISTINCT topic, day
+        FROM unnest(CAST(:topics AS text[]), CAST(:days AS date[])) AS k(topic, day)
+    ),
+    counts AS (
+        SELECT k.topic, k.day, count(p.ts) AS points_count
+        FROM keys k
+        LEFT JOIN pv_forecast_points p ON p.topic = k.topic AND p.day = k.day
+        GROUP BY k.topic, k.day
+    ),
+    removed AS (
+        DELETE FROM pv_forecast_points_daily d
+        USING counts c
+        WHERE d.topic = c.topic AND d.day = c.day AND c.points_count = 0
+    )
+    INSERT INTO pv_forecast_points_daily (topic, day, points_count)
+    SELECT topic, day, points_count FROM counts WHERE points_count > 0
+    ON CONFLICT (topic, day) DO UPDATE SET points_count = EXCLUDED.points_count
+    """
+)
+_DELETE_DAILY_FROM_QUERY = text("DELETE FROM pv_forecast_points_daily WHERE day >= :day")
+_INSERT_DAILY_FOR_DAY_QUERY = text(
+    """
+    INSERT INTO pv_forecast_points_daily (topic, day, points_count)
+    SELECT topic, day, count(*)
+    FROM pv_forecast_points
+    WHERE ts >= :day AND ts < :next_day AND day = :day
+    GROUP BY topic, day
+    """
+)
+
+
+def _utc_day(ts: datetime) -> date:
+    # Naive timestamps are UTC, like everywhere else in this module.
+    return ts.date() if ts.tzinfo is None else ts.astimezone(timezone.utc).date()
+
+
+def _recount_daily(conn, keys: set[tuple[str, date]]) -> None:
+    if not keys:
+        return
+    topics, days = zip(*keys)
+    conn.execute(_RECOUNT_DAILY_QUERY, {"topics": list(topics), "days": list(days)})
+
+
+def warm_pool(connections: int | None = None) -> None:
+    """Open pool connections up front so the first requests skip the connect handshake."""
+    count = connections if connections is not None else engine.pool.size()
+    opened = []
+    try:
+        for _ in range(count):
+            opened.append(engine.connect())
+    finally:
+        for conn in opened:
+            conn.close()
 
 
 def _month_bounds(ts: datetime) -> tuple[datetime, datetime]:
@@ -40,65 +190,77 @@ def _month_bounds(ts: datetime) -> tuple[datetime, datetime]:
     return month_start, next_month
 
 
-def ensure_month_partitions(start_ts: datetime, end_ts: datetime) -> None:
+def _month_ranges(start_ts: datetime, end_ts: datetime) -> list[tuple[datetime, datetime]]:
+    ranges: list[tuple[datetime, datetime]] = []
     cursor = start_ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while cursor <= end_ts:
+        frm, to = _month_bounds(cursor)
+        ranges.append((frm, to))
+        cursor = to
+    return ranges
+
+
+def ensure_month_partitions(start_ts: datetime, end_ts: datetime) -> None:
+    ranges = _month_ranges(start_ts, end_ts)
+    if not ranges:
+        return
+
+    # One round-trip for all months instead of one DDL statement per month.
+    statements: list[str] = []
+    params: dict[str, datetime] = {}
+    for i, (frm, to) in enumerate(ranges):
+        table_name = f"pv_forecast_points_{frm.year}_{frm.month:02d}"
+        statements.append(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table_name}
+            PARTITION OF pv_forecast_points
+            FOR VALUES FROM (:frm_{i}) TO (:to_{i});
+            """
+        )
+        params[f"frm_{i}"] = frm
+        params[f"to_{i}"] = to
+
     with engine.begin() as conn:
-        while cursor <= end_ts:
-            frm, to = _month_bounds(cursor)
-            table_name = f"pv_forecast_points_{frm.year}_{frm.month:02d}"
-            conn.execute(
-                text(
-                    f"""
-                    CREATE TABLE IF NOT EXISTS {table_name}
-                    PARTITION OF pv_forecast_points
-                    FOR VALUES FROM (:frm) TO (:to);
-                    """
-                ),
-                {"frm": frm, "to": to},
-            )
-            cursor = to
+        conn.execute(text("".join(statements)), params)
+
+
+_DELETE_FUTURE_QUERY = text("DELETE FROM pv_forecast_points WHERE ts >= :start_ts")
 
 
 def delete_future(start_ts: datetime) -> None:
+    start_day = _utc_day(start_ts)
     with engine.begin() as conn:
-        conn.execute(text("DELETE FROM pv_forecast_points WHERE ts >= :start_ts"), {"start_ts": start_ts})
+        conn.execute(_DELETE_FUTURE_QUERY, {"start_ts": start_ts})
+        # Later days are now empty; the first day keeps its points before start_ts, so count it again.
+        conn.execute(_DELETE_DAILY_FROM_QUERY, {"day": start_day})
+        conn.execute(_INSERT_DAILY_FOR_DAY_QUERY, {"day": start_day, "next_day": start_day + timedelta(days=1)})
 
 
 def bulk_upsert_points(rows: Sequence[tuple[str, datetime, float, str]]) -> None:
     if not rows:
         return
 
-    sql = """
-    INSERT INTO pv_forecast_points (topic, ts, power, source)
-    VALUES %s
-    ON CONFLICT (topic, ts)
-    DO UPDATE SET
-      power = EXCLUDED.power,
-      source = EXCLUDED.source,
-      created_at = now()
-    """
+    params = [{"topic": topic, "ts": ts, "power": power, "source": source} for topic, ts, power, source in rows]
+    keys = {(topic, _utc_day(ts)) for topic, ts, _power, _source in rows}
+    with engine.begin() as conn:
+        conn.execute(_UPSERT_POINTS, params)
+        _recount_daily(conn, keys)
 
-    raw_conn = engine.raw_connection()
-    try:
-        with raw_conn.cursor() as cur:
-            execute_values(cur, sql, rows, page_size=5000)
-        raw_conn.commit()
-    finally:
-        raw_conn.close()
+
+_EXISTING_DAYS_QUERY = text(
+    """
+    SELECT DISTINCT day
+    FROM pv_forecast_points
+    WHERE topic = :topic
+      AND ts >= :start
+      AND ts < :end
+    """
+)
 
 
 def find_missing_days(topic: str, start_date: date, end_date: date) -> list[date]:
-    query = text(
-        """
-        SELECT DISTINCT DATE(ts) AS day
-        FROM pv_forecast_points
-        WHERE topic = :topic
-          AND ts >= :start
-          AND ts < :end
-        """
-    )
     with engine.connect() as conn:
-        rows = conn.execute(query, {"topic": topic, "start": start_date, "end": end_date}).all()
+        rows = conn.execute(_EXISTING_DAYS_QUERY, {"topic": topic, "start": start_date, "end": end_date}).all()
 
     existing = {row[0] for row in rows if row[0] is not None}
     all_days: list[date] = []
@@ -110,13 +272,29 @@ def find_missing_days(topic: str, start_date: date, end_date: date) -> list[date
     return [d for d in all_days if d not in existing]
 
 
+_DELETE_DAY_QUERY = text("DELETE FROM pv_forecast_points WHERE topic = :topic AND ts >= :day AND ts < :next_day")
+
+
 def delete_day(topic: str, day: date) -> None:
     next_day = day + timedelta(days=1)
     with engine.begin() as conn:
-        conn.execute(
-            text("DELETE FROM pv_forecast_points WHERE topic = :topic AND ts >= :day AND ts < :next_day"),
-            {"topic": topic, "day": day, "next_day": next_day},
-        )
+        conn.execute(_DELETE_DAY_QUERY, {"topic": topic, "day": day, "next_day": next_day})
+        _recount_daily(conn, {(topic, day)})
+
+
+SELECT_POINTS_BATCH_SIZE = 2000
+
+# Array parameter keeps the SQL text constant regardless of how many topics are requested.
+_SELECT_POINTS_QUERY = text(
+    """
+    SELECT topic, to_char(ts, 'YYYY-MM-DD HH24:MI') AS x, power AS y
+    FROM pv_forecast_points
+    WHERE topic = ANY(:topics)
+      AND ts >= :start_ts
+      AND ts < :end_ts
+    ORDER BY topic, ts
+    """
+)
 
 
 def select_points(topics: Sequence[str], start_ts: datetime, end_ts: datetime) -> dict[str, list[dict[str, float | str]]]:
@@ -124,25 +302,12 @@ def select_points(topics: Sequence[str], start_ts: datetime, end_ts: datetime) -
         return {}
 
     result: dict[str, list[dict[str, float | str]]] = {topic: [] for topic in topics}
-    query = text(
-        """
-        SELECT topic, ts, power
-        FROM pv_forecast_points
-        WHERE topic = ANY(:topics)
-          AND ts >= :start_ts
-          AND ts < :end_ts
-        ORDER BY topic, ts
-        """
-    )
-
+    params = {"topics": list(topics), "start_ts": start_ts, "end_ts": end_ts}
+    # Server-side cursor: rows arrive in batches instead of one fully buffered result set.
     with engine.connect() as conn:
-        rows = conn.execute(query, {"topics": list(topics), "start_ts": start_ts, "end_ts": end_ts}).mappings().all()
-
-    for row in rows:
-        result[row["topic"]].append({
-            "x": row["ts"].strftime("%Y-%m-%d %H:%M"),
-            "y": float(row["power"]),
-        })
+        rows = conn.execution_options(yield_per=SELECT_POINTS_BATCH_SIZE).execute(_SELECT_POINTS_QUERY, params)
+        for topic, x, y in rows:
+            result[topic].append({"x": x, "y": y})
 
     return result
 
@@ -159,34 +324,32 @@ def select_available_forecasts(
         where_parts.append("topic = :topic")
         params["topic"] = topic
     if date_from:
-        where_parts.append("ts >= :date_from")
-        params["date_from"] = date_from
+        where_parts.append("day >= :date_from")
+        params["date_from"] = date_from.date()
     if date_to:
-        where_parts.append("ts < :date_to")
-        params["date_to"] = date_to
+        where_parts.append("day < :date_to")
+        params["date_to"] = date_to.date()
 
     where_clause = ""
     if where_parts:
         where_clause = "WHERE " + " AND ".join(where_parts)
 
-    count_query = text(f"SELECT COUNT(*) AS total FROM pv_forecast_points {where_clause}")
-    topics_query = text(f"SELECT DISTINCT topic FROM pv_forecast_points {where_clause} ORDER BY topic")
-    dates_query = text(
+    summary_query = text(
         f"""
-        SELECT DISTINCT DATE(ts) AS day
-        FROM pv_forecast_points
+        SELECT
+            coalesce(sum(points_count), 0) AS total,
+            array_agg(DISTINCT topic ORDER BY topic) AS topics,
+            array_agg(DISTINCT day ORDER BY day) AS days
+        FROM pv_forecast_points_daily
         {where_clause}
-        ORDER BY day
         """
     )
 
     with engine.connect() as conn:
-        total = int(conn.execute(count_query, params).scalar_one())
-        found_topics = [row[0] for row in conn.execute(topics_query, params).all()]
-        found_dates = [row[0].isoformat() for row in conn.execute(dates_query, params).all() if row[0] is not None]
+        row = conn.execute(summary_query, params).mappings().one()
 
     return {
-        "count": total,
-        "topics": found_topics,
-        "dates": found_dates,
+        "count": int(row["total"]),
+        "topics": list(row["topics"] or []),
+        "dates": [day.isoformat() for day in row["days"] or [] if day is not None],
     }
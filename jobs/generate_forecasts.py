@@ -1,77 +1,232 @@
 import argparse
 import logging
-from datetime import datetime, timedelta
-
+import multiprocessing
+import threading
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import repeat
+
+import numpy as np
 import pandas as pd
 
 from config import load_settings
-from database import get_all_topics, get_tag_specification
-from forecast_db import bulk_upsert_points, delete_future, ensure_month_partitions, find_missing_days, run_migrations
+from database import get_all_topics, get_tag_specification, get_tag_specifications
+from forecast_db import (
+    bulk_upsert_points,
+    delete_future,
+    ensure_month_partitions,
+    find_missing_days,
+    run_migrations,
+)
 from model_loader import load_model
-from production import calculate_system_production
-from radiation import calculate_panel_irradiance
-from weather_service import get_weather_for_date
+from production import calculate_system_production_array
+from radiation import calculate_panel_irradiance_series
+from weather_service import WeatherFetchResult, get_weather_for_date, get_weather_for_dates
 
 logger = logging.getLogger(__name__)
 
 THRESHOLD_RADIATION = 40
+UPSERT_BATCH_SIZE = 5000
 settings = load_settings()
 
+# (replicator_id, user_object_id, latitude, longitude) — everything get_weather_for_date depends on.
+WeatherKey = tuple[object, int, float, float]
+
 
-def _build_rows_for_topic(topic: str, records: list[dict], source: str) -> list[tuple[str, datetime, float, str]]:
-    spec = get_tag_specification(topic)
+def _build_rows_for_topic(
+    topic: str,
+    records: list[dict],
+    source: str,
+    spec: dict | None = None,
+) -> Iterator[tuple[str, datetime, float, str]]:
+    """Yield forecast rows one by one so callers can stream them into their upsert batches."""
+    if spec is None:
+        spec = get_tag_specification(topic)
     if not spec:
-        return []
+        return
 
     uid = spec.get("sm_user_object_id")
     lat = spec.get("latitude")
     lon = spec.get("longitude")
     if uid is None or lat is None or lon is None:
-        return []
+        return
 
-    tilt = spec.get("tilt", 0.0)
-    azimuth = spec.get("azimuth", 180.0)
+    # NULL columns may come back as None; fall back to the same defaults as a missing key.
+    tilt = spec.get("tilt")
+    tilt = 0.0 if tilt is None else tilt
+    azimuth = spec.get("azimuth")
+    azimuth = 180.0 if azimuth is None else azimuth
     mlen = spec.get("module_length")
     mwid = spec.get("module_width")
-    meff_pct = spec.get("module_efficiency", 17.7)
+    meff_pct = spec.get("module_efficiency")
+    meff_pct = 17.7 if meff_pct is None else meff_pct
     panels = spec.get("total_panels", 0)
     comm = spec.get("commissioning_date")
-    degr = spec.get("degradation_rate", 0.0)
     if not mlen or not mwid or not panels or not comm:
-        return []
+        return
 
     panel_area = (mlen / 1000) * (mwid / 1000)
     mod_eff = meff_pct / 100.0
     model_name = topic.replace("/", "_") + "_model.pkl"
     model = load_model(model_name)
 
-    out = []
+    times: list[datetime] = []
+    temps: list[float] = []
+    clouds: list[float] = []
     for rec in records:
         t = rec.get("time")
         if not t:
             continue
-        dt = datetime.strptime(t, "%Y-%m-%d %H:%M")
-        irr = calculate_panel_irradiance(lat, lon, dt, tilt, azimuth, tz="Europe/Nicosia")
-        if irr < THRESHOLD_RADIATION:
-            eff = 0.0
-        elif model is not None:
-            df = pd.DataFrame({"radiation_w_m2_y": [irr], "cloud": [float(rec.get("cloud", 0) or 0)]})
-            eff = float(model.predict(df)[0])
-        else:
-            eff = irr
-
-        base = eff * panel_area * mod_eff
-        power = calculate_system_production(
-            panel_power=base,
-            temp_c=float(rec.get("temp_c", 25) or 25),
-            cloud_cover=float(rec.get("cloud", 0) or 0) / 100.0,
-            num_panels=int(panels),
-            forecast_date=dt,
-            commissioning_date=datetime.strptime(str(comm), "%Y-%m-%d"),
-            degradation_rate=degr,
-        )
-        out.append((topic, dt, float(power), source))
-    return out
+        times.append(datetime.strptime(t, "%Y-%m-%d %H:%M"))
+        temps.append(float(rec.get("temp_c", 25) or 25))
+        clouds.append(float(rec.get("cloud", 0) or 0))
+    if not times:
+        return
+
+    # Whole day in one pass: one pvlib call, one model.predict, array math for production.
+    irr = calculate_panel_irradiance_series(lat, lon, times, tilt, azimuth, tz="Europe/Nicosia")
+    cloud = np.asarray(clouds, dtype=float)
+    lit = irr >= THRESHOLD_RADIATION
+    if model is None:
+        eff = np.where(lit, irr, 0.0)
+    else:
+        eff = np.zeros(len(times), dtype=float)
+        if lit.any():
+            features = pd.DataFrame({"radiation_w_m2_y": irr[lit], "cloud": cloud[lit]})
+            eff[lit] = np.asarray(model.predict(features), dtype=float)
+
+    base = eff * panel_area * mod_eff
+    power = calculate_system_production_array(
+        panel_power=base,
+        temp_c=np.asarray(temps, dtype=float),
+        cloud_cover=cloud / 100.0,
+        num_panels=int(panels),
+    )
+    for dt, value in zip(times, power.tolist()):
+        yield topic, dt, value, source
+
+
+class _BackgroundUpserter:
+    """Writes upsert batches on one background thread so the next batch is computed while the previous is written.
+
+    At most one batch is in flight; a failed write is re-raised on the next submit or on exit.
+    """
+
+    def __init__(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="forecast-upsert")
+        self._pending: Future | None = None
+
+    def submit(self, rows: list[tuple[str, datetime, float, str]]) -> None:
+        self._wait()
+        self._pending = self._executor.submit(bulk_upsert_points, rows)
+
+    def _wait(self) -> None:
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def __enter__(self) -> "_BackgroundUpserter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        try:
+            self._wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+def _flush_rows(
+    rows: list[tuple[str, datetime, float, str]],
+    writer: _BackgroundUpserter,
+    force: bool = False,
+) -> int:
+    """Hand buffered rows to the writer once the batch is full (or when forced) and clear the buffer."""
+    if not rows or (not force and len(rows) < UPSERT_BATCH_SIZE):
+        return 0
+    written = len(rows)
+    writer.submit(rows.copy())
+    rows.clear()
+    return written
+
+
+def _weather_key(spec: dict) -> WeatherKey | None:
+    uid = spec.get("sm_user_object_id")
+    lat = spec.get("latitude")
+    lon = spec.get("longitude")
+    if uid is None or lat is None or lon is None:
+        return None
+    return spec.get("replicator_id"), int(uid), round(float(lat), 4), round(float(lon), 4)
+
+
+def _group_topics_by_weather(topics: list[str]) -> dict[WeatherKey, list[tuple[str, dict]]]:
+    """Group topics that share a plant location so weather is fetched once per group and day."""
+    groups: dict[WeatherKey, list[tuple[str, dict]]] = {}
+    specs = get_tag_specifications(topics)
+    for topic in topics:
+        spec = specs.get(topic)
+        if not spec:
+            continue
+        key = _weather_key(spec)
+        if key is None:
+            continue
+        groups.setdefault(key, []).append((topic, spec))
+    return groups
+
+
+def _fetch_weather(key: WeatherKey, day: date, today: date) -> WeatherFetchResult:
+    rid, uid, lat, lon = key
+    return get_weather_for_date(
+        replicator_id=rid,
+        user_object_id=uid,
+        latitude=lat,
+        longitude=lon,
+        prediction_date=day,
+        today=today,
+    )
+
+
+def _fetch_weather_days(key: WeatherKey, days: list[date], today: date) -> dict[date, WeatherFetchResult]:
+    rid, uid, lat, lon = key
+    return get_weather_for_dates(
+        replicator_id=rid,
+        user_object_id=uid,
+        latitude=lat,
+        longitude=lon,
+        prediction_dates=days,
+        today=today,
+    )
+
+
+def _compute_group_days(
+    key: WeatherKey,
+    members: list[tuple[str, dict]],
+    days: list[date],
+    today: date,
+) -> list[tuple[str, datetime, float, str]]:
+    """Weather + forecast rows for one location group over the given days (runs in a worker process)."""
+    rows: list[tuple[str, datetime, float, str]] = []
+    for day in days:
+        weather_result = _fetch_weather(key, day, today)
+        for topic, spec in members:
+            rows.extend(_build_rows_for_topic(topic, weather_result.records, weather_result.source, spec=spec))
+    return rows
+
+
+def _compute_groups(
+    groups: dict[WeatherKey, list[tuple[str, dict]]],
+    days: list[date],
+    today: date,
+) -> Iterator[list[tuple[str, datetime, float, str]]]:
+    workers = min(settings.forecast_workers, len(groups))
+    if workers <= 1:
+        for key, members in groups.items():
+            yield _compute_group_days(key, members, days, today)
+        return
+
+    # spawn: workers must not inherit the parent's DB connections, locks or scheduler threads.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        yield from executor.map(_compute_group_days, groups.keys(), groups.values(), repeat(days), repeat(today), chunksize=1)
 
 
 def run_future() -> None:
@@ -81,38 +236,20 @@ def run_future() -> None:
     ensure_month_partitions(now, end)
     delete_future(now)
 
-    rows = []
-    for topic in get_all_topics():
-        spec = get_tag_specification(topic)
-        if not spec:
-            continue
-        uid = spec.get("sm_user_object_id")
-        lat = spec.get("latitude")
-        lon = spec.get("longitude")
-        if uid is None or lat is None or lon is None:
-            continue
-
-        rid = spec.get("replicator_id")
-        for day_offset in range(settings.forecast_days_ahead + 1):
-            target_day = (now + timedelta(days=day_offset)).date()
-            weather_result = get_weather_for_date(
-                replicator_id=rid,
-                user_object_id=int(uid),
-                latitude=float(lat),
-                longitude=float(lon),
-                prediction_date=target_day,
-            )
-            rows.extend(_build_rows_for_topic(topic, weather_result["records"], weather_result["source"]))
-            if len(rows) >= 5000:
-                bulk_upsert_points(rows)
-                rows.clear()
-
-    if rows:
-        bulk_upsert_points(rows)
+    rows: list[tuple[str, datetime, float, str]] = []
+    written = 0
+    days = [(now + timedelta(days=day_offset)).date() for day_offset in range(settings.forecast_days_ahead + 1)]
+    with _BackgroundUpserter() as writer:
+        for group_rows in _compute_groups(_group_topics_by_weather(get_all_topics()), days, now.date()):
+            rows.extend(group_rows)
+            written += _flush_rows(rows, writer)
 
+        written += _flush_rows(rows, writer, force=True)
+    logger.info("[run_future] written_points=%d", written)
 
 
-def run_history(days: int | None = None) -> None:
+def run_history(days: int | None = None, stop: threading.Event | None = None) -> None:
+    """Fill missing days; when stop is set, return after the current day (points written so far are kept)."""
     history_days = settings.forecast_history_days if days is None else days
     now = datetime.utcnow()
     start = now - timedelta(days=history_days)
@@ -120,41 +257,40 @@ def run_history(days: int | None = None) -> None:
     ensure_month_partitions(start, now)
 
     rows: list[tuple[str, datetime, float, str]] = []
-    for topic in get_all_topics():
-        spec = get_tag_specification(topic)
-        if not spec:
-            continue
-        uid = spec.get("sm_user_object_id")
-        lat = spec.get("latitude")
-        lon = spec.get("longitude")
-        if uid is None or lat is None or lon is None:
-            continue
-
-        missing = find_missing_days(topic, start.date(), now.date())
-        if not missing:
-            continue
-
-        logger.info("[run_history] topic=%s missing_days=%d", topic, len(missing))
-        rid = spec.get("replicator_id")
-        for day in missing:
-            weather_result = get_weather_for_date(
-                replicator_id=rid,
-                user_object_id=int(uid),
-                latitude=float(lat),
-                longitude=float(lon),
-                prediction_date=day,
-            )
-            rows.extend(_build_rows_for_topic(topic, weather_result["records"], weather_result["source"]))
-            if len(rows) >= 5000:
-                bulk_upsert_points(rows)
-                rows.clear()
-
-    if rows:
-        bulk_upsert_points(rows)
-
-
-def run_fixation() -> None:
-    yesterday = (datetime.utcnow() - timedelta(days=1)).date()
+    written = 0
+    with _BackgroundUpserter() as writer:
+        for key, members in _group_topics_by_weather(get_all_topics()).items():
+            missing_by_topic: dict[str, set[date]] = {}
+            for topic, _spec in members:
+                missing = find_missing_days(topic, start.date(), now.date())
+                if missing:
+                    logger.info("[run_history] topic=%s missing_days=%d", topic, len(missing))
+                    missing_by_topic[topic] = set(missing)
+            if not missing_by_topic:
+                continue
+
+            missing_days = sorted(set().union(*missing_by_topic.values()))
+            weather_by_day = _fetch_weather_days(key, missing_days, now.date())
+            for day in missing_days:
+                if stop is not None and stop.is_set():
+                    break
+                weather_result = weather_by_day[day]
+                for topic, spec in members:
+                    if day in missing_by_topic.get(topic, ()):
+                        rows.extend(_build_rows_for_topic(topic, weather_result.records, weather_result.source, spec=spec))
+                written += _flush_rows(rows, writer)
+            if stop is not None and stop.is_set():
+                logger.info("[run_history] stop requested, leaving remaining days for the next run")
+                break
+
+        written += _flush_rows(rows, writer, force=True)
+    logger.info("[run_history] written_points=%d", written)
+
+
+def run_fixation(stop: threading.Event | None = None) -> None:
+    """Recompute yesterday from archive weather; when stop is set, return after the current weather group."""
+    today = datetime.utcnow().date()
+    yesterday = today - timedelta(days=1)
     run_migrations()
     ensure_month_partitions(
         datetime.combine(yesterday, datetime.min.time()),
@@ -162,41 +298,33 @@ def run_fixation() -> None:
     )
 
     topics = get_all_topics()
+    groups = _group_topics_by_weather(topics)
     processed = 0
-    skipped = 0
+    skipped = len(topics) - sum(len(members) for members in groups.values())
 
-    for topic in topics:
-        spec = get_tag_specification(topic)
-        if not spec:
-            skipped += 1
-            continue
-
-        uid = spec.get("sm_user_object_id")
-        lat = spec.get("latitude")
-        lon = spec.get("longitude")
-        if uid is None or lat is None or lon is None:
-            skipped += 1
-            continue
-
-        rid = spec.get("replicator_id")
-        weather_result = get_weather_for_date(
-            replicator_id=rid,
-            user_object_id=int(uid),
-            latitude=float(lat),
-            longitude=float(lon),
-            prediction_date=yesterday,
-        )
-
-        source = weather_result["source"]
-        if source == "weather_api":
-            skipped += 1
-            logger.info("[run_fixation] topic=%s skipped (source=weather_api, no archive data)", topic)
-            continue
-
-        rows = _build_rows_for_topic(topic, weather_result["records"], "archive_db")
-        if rows:
-            bulk_upsert_points(rows)
-            processed += 1
+    rows: list[tuple[str, datetime, float, str]] = []
+    with _BackgroundUpserter() as writer:
+        for key, members in groups.items():
+            if stop is not None and stop.is_set():
+                logger.info("[run_fixation] stop requested, remaining groups not processed")
+                break
+            weather_result = _fetch_weather(key, yesterday, today)
+
+            source = weather_result.source
+            if source == "weather_api":
+                skipped += len(members)
+                for topic, _spec in members:
+                    logger.info("[run_fixation] topic=%s skipped (source=weather_api, no archive data)", topic)
+                continue
+
+            for topic, spec in members:
+                before = len(rows)
+                rows.extend(_build_rows_for_topic(topic, weather_result.records, "archive_db", spec=spec))
+                if len(rows) > before:
+                    processed += 1
+            _flush_rows(rows, writer)
+
+        _flush_rows(rows, writer, force=True)
 
     logger.info("[run_fixation] yesterday=%s processed=%d skipped=%d", yesterday, processed, skipped)
 
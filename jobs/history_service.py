@@ -1,83 +1,146 @@
 from __future__ import annotations
 
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from threading import Lock
 from uuid import uuid4
 
+from jobs import jobs_store
 from jobs.generate_forecasts import run_fixation, run_history
 
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL_SECONDS = 30
+# A job is considered abandoned once its owner has missed several heartbeats.
+STALE_AFTER_SECONDS = 180
+
 
 class HistoryJobService:
+    """Job bookkeeping lives in PostgreSQL so every API worker sees the same jobs."""
+
     def __init__(self) -> None:
-        self._lock = Lock()
-        self._jobs: dict[str, dict] = {}
-        self._running_job_id: str | None = None
+        # Only one job can be active at a time, so a single worker thread is enough.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-job")
+        # Identifies this API worker process as the owner of the jobs it creates and heartbeats.
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        # Set on shutdown; the running job checks it between days and returns early.
+        self._stopping = threading.Event()
 
     def create_job(self, days: int) -> dict:
-        with self._lock:
-            if self._running_job_id:
-                running_job = self._jobs[self._running_job_id]
+        while True:
+            job = jobs_store.create_job(str(uuid4()), days=days, created_at=datetime.utcnow(), owner=self._owner)
+            if job is not None:
+                return {
+                    "started": True,
+                    "job": job,
+                }
+
+            # The slot may be held by a job whose worker died; free it and try again.
+            if self.fail_interrupted_jobs():
+                continue
+
+            running_job = jobs_store.get_active_job()
+            # The active job may have finished between the two statements; try again in that case.
+            if running_job is not None:
                 return {
                     "started": False,
                     "job": running_job,
                 }
 
-            job_id = str(uuid4())
-            job = {
-                "id": job_id,
-                "state": "queued",
-                "days": days,
-                "created_at": datetime.utcnow(),
-                "started_at": None,
-                "finished_at": None,
-                "error": None,
-            }
-            self._jobs[job_id] = job
-            self._running_job_id = job_id
-            return {
-                "started": True,
-                "job": job,
-            }
-
     def run_job(self, job_id: str) -> None:
         self._set_state(job_id, state="running", started_at=datetime.utcnow())
         try:
-            days = int(self._jobs[job_id]["days"])
-            run_history(days=days)
+            job = jobs_store.get_job(job_id)
+            days = int(job["days"])
+            run_history(days=days, stop=self._stopping)
         except Exception as exc:
             self._set_state(job_id, state="failed", error=str(exc), finished_at=datetime.utcnow())
             raise
         else:
-            self._set_state(job_id, state="completed", finished_at=datetime.utcnow())
-        finally:
-            with self._lock:
-                if self._running_job_id == job_id:
-                    self._running_job_id = None
+            self._finish(job_id)
 
     def run_fixation_job(self, job_id: str) -> None:
         self._set_state(job_id, state="running", started_at=datetime.utcnow())
         try:
-            run_fixation()
+            run_fixation(stop=self._stopping)
         except Exception as exc:
             self._set_state(job_id, state="failed", error=str(exc), finished_at=datetime.utcnow())
             raise
+        else:
+            self._finish(job_id)
+
+    def _finish(self, job_id: str) -> None:
+        if self._stopping.is_set():
+            # Stopped early; a new job picks up the days that are still missing.
+            self._set_state(
+                job_id,
+                state="failed",
+                error="interrupted: worker shutting down",
+                finished_at=datetime.utcnow(),
+            )
         else:
             self._set_state(job_id, state="completed", finished_at=datetime.utcnow())
-        finally:
-            with self._lock:
-                if self._running_job_id == job_id:
-                    self._running_job_id = None
+
+    def enqueue_run(self, job_id: str) -> Future:
+        return self._submit(self.run_job, job_id)
+
+    def enqueue_fixation(self, job_id: str) -> Future:
+        return self._submit(self.run_fixation_job, job_id)
+
+    def shutdown(self) -> None:
+        """Cancel queued jobs and ask the running one to stop.
+
+        The running job still finishes the day (or weather group) it is on before the worker thread exits,
+        so process exit waits for at most that one step.
+        """
+        self._stopping.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, func, job_id: str) -> Future:
+        stop_heartbeat = threading.Event()
+        threading.Thread(
+            target=self._heartbeat,
+            args=(job_id, stop_heartbeat),
+            name=f"history-job-heartbeat-{job_id}",
+            daemon=True,
+        ).start()
+
+        future = self._executor.submit(func, job_id)
+        future.add_done_callback(lambda f: stop_heartbeat.set())
+        future.add_done_callback(lambda f: self._log_failure(job_id, f))
+        return future
+
+    def _heartbeat(self, job_id: str, stop: threading.Event) -> None:
+        while not stop.wait(HEARTBEAT_INTERVAL_SECONDS):
+            try:
+                jobs_store.touch_job(job_id, self._owner)
+            except Exception as exc:
+                logger.warning("[history_job] heartbeat failed for job_id=%s: %s", job_id, exc)
+
+    @staticmethod
+    def _log_failure(job_id: str, future: Future) -> None:
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            logger.error("[history_job] job_id=%s failed", job_id, exc_info=exc)
 
     def get_job(self, job_id: str) -> dict | None:
-        with self._lock:
-            job = self._jobs.get(job_id)
-            if not job:
-                return None
-            return dict(job)
+        return jobs_store.get_job(job_id)
+
+    def fail_interrupted_jobs(self) -> int:
+        """Fail only jobs whose owner stopped heartbeating; jobs of live workers are left alone."""
+        return jobs_store.fail_stale_jobs(
+            "interrupted: owning worker stopped",
+            finished_at=datetime.utcnow(),
+            stale_after_seconds=STALE_AFTER_SECONDS,
+        )
 
     def _set_state(self, job_id: str, **updates: object) -> None:
-        with self._lock:
-            self._jobs[job_id].update(updates)
+        jobs_store.update_job(job_id, **updates)
 
 
 history_job_service = HistoryJobService()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from datetime import datetime
+from functools import lru_cache
+
+from sqlalchemy import text
+
+from forecast_db import engine
+
+_JOB_COLUMNS = "id, state, days, created_at, started_at, finished_at, error"
+_UPDATABLE_FIELDS = {"state", "started_at", "finished_at", "error"}
+
+_CREATE_JOB_QUERY = text(
+    f"""
+    INSERT INTO pv_forecast_jobs (id, state, days, created_at, owner, heartbeat_at)
+    VALUES (:id, 'queued', :days, :created_at, :owner, now())
+    ON CONFLICT DO NOTHING
+    RETURNING {_JOB_COLUMNS}
+    """
+)
+_ACTIVE_JOB_QUERY = text(f"SELECT {_JOB_COLUMNS} FROM pv_forecast_jobs WHERE state IN ('queued', 'running') LIMIT 1")
+_GET_JOB_QUERY = text(f"SELECT {_JOB_COLUMNS} FROM pv_forecast_jobs WHERE id = :id")
+_TOUCH_JOB_QUERY = text("UPDATE pv_forecast_jobs SET heartbeat_at = now() WHERE id = :id AND owner = :owner")
+# Heartbeats use the database clock, so API workers on different hosts agree on what "stale" means.
+_FAIL_STALE_JOBS_QUERY = text(
+    """
+    UPDATE pv_forecast_jobs
+    SET state = 'failed', error = :error, finished_at = :finished_at
+    WHERE state IN ('queued', 'running')
+      AND (heartbeat_at IS NULL OR heartbeat_at < now() - make_interval(secs => :stale_after_seconds))
+    """
+)
+
+
+@lru_cache(maxsize=None)
+def _update_job_query(names: tuple[str, ...]):
+    # Only a handful of field combinations are ever used, so one statement per combination.
+    assignments = ", ".join(f"{name} = :{name}" for name in names)
+    return text(f"UPDATE pv_forecast_jobs SET {assignments} WHERE id = :id")
+
+
+def create_job(job_id: str, days: int, created_at: datetime, owner: str) -> dict | None:
+    """Insert a queued job owned by `owner`. Returns None if another job is already queued or running."""
+    params = {"id": job_id, "days": days, "created_at": created_at, "owner": owner}
+    with engine.begin() as conn:
+        row = conn.execute(_CREATE_JOB_QUERY, params).mappings().first()
+    return dict(row) if row else None
+
+
+def get_active_job() -> dict | None:
+    with engine.connect() as conn:
+        row = conn.execute(_ACTIVE_JOB_QUERY).mappings().first()
+    return dict(row) if row else None
+
+
+def get_job(job_id: str) -> dict | None:
+    with engine.connect() as conn:
+        row = conn.execute(_GET_JOB_QUERY, {"id": job_id}).mappings().first()
+    return dict(row) if row else None
+
+
+def update_job(job_id: str, **fields: object) -> None:
+    unknown = set(fields) - _UPDATABLE_FIELDS
+    if unknown:
+        raise ValueError(f"unknown job fields: {sorted(unknown)}")
+    if not fields:
+        return
+
+    query = _update_job_query(tuple(sorted(fields)))
+    with engine.begin() as conn:
+        conn.execute(query, {**fields, "id": job_id})
+
+
+def touch_job(job_id: str, owner: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(_TOUCH_JOB_QUERY, {"id": job_id, "owner": owner})
+
+
+def fail_stale_jobs(error: str, finished_at: datetime, stale_after_seconds: int) -> int:
+    """Mark queued/running jobs whose owner stopped heartbeating as failed (e.g. its process was restarted)."""
+    params = {"error": error, "finished_at": finished_at, "stale_after_seconds": stale_after_seconds}
+    with engine.begin() as conn:
+        return conn.execute(_FAIL_STALE_JOBS_QUERY, params).rowcount
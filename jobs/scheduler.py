@@ -1,4 +1,5 @@
 import logging
+import signal
 import threading
 import time
 
@@ -10,16 +11,18 @@ logger = logging.getLogger(__name__)
 settings = load_settings()
 
 
-def _run_loop(name: str, func, interval_seconds: int) -> None:
-    """Universal loop: run func, sleep interval_seconds, repeat."""
-    while True:
+def _run_loop(name: str, func, interval_seconds: int, stop: threading.Event) -> None:
+    """Universal loop: run func every interval_seconds (start to start, no drift) until stop is set."""
+    while not stop.is_set():
+        deadline = time.monotonic() + interval_seconds
         try:
             logger.info("[%s] starting", name)
             func()
-            logger.info("[%s] completed, sleeping %ds", name, interval_seconds)
+            logger.info("[%s] completed, sleeping %ds", name, max(0, deadline - time.monotonic()))
         except Exception:
             logger.exception("[%s] failed", name)
-        time.sleep(interval_seconds)
+        if stop.wait(max(0.0, deadline - time.monotonic())):
+            break
 
 
 def main() -> None:
@@ -29,25 +32,36 @@ def main() -> None:
     # Process 1: fill history gaps on startup
     run_history()
 
+    stop = threading.Event()
+
+    def _request_stop(signum, _frame) -> None:
+        logger.info("received signal %s, stopping after the current runs", signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
     # Process 2: refresh forecast every N minutes
     forecast_thread = threading.Thread(
         target=_run_loop,
-        args=("forecast", run_future, settings.forecast_refresh_minutes * 60),
+        args=("forecast", run_future, settings.forecast_refresh_minutes * 60, stop),
         daemon=True,
     )
 
     # Process 3: fixation of yesterday's fact — once per day
     fixation_thread = threading.Thread(
         target=_run_loop,
-        args=("fixation", run_fixation, 86400),
+        args=("fixation", run_fixation, 86400, stop),
         daemon=True,
     )
 
     forecast_thread.start()
     fixation_thread.start()
 
-    # Main thread waits (daemon threads die with process)
+    # Main thread waits for a stop signal, then lets in-flight runs finish
+    stop.wait()
     forecast_thread.join()
+    fixation_thread.join()
 
 
 if __name__ == "__main__":
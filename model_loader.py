@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
+from threading import Lock
 import joblib
+from cachetools import LRUCache
 import logging
 import numpy as np
 import pandas as pd
@@ -10,6 +12,13 @@ logger = logging.getLogger(__name__)
 
 _LOGGED_MISSING_MODEL_PATHS = set()
 _LOGGED_FALLBACK_SUCCESS_KEYS = set()
+# Само успешно заредени модели; при неуспех следващото извикване опитва отново.
+# Моделите са по един на topic, затова кешът е ограничен (LRU), както беше с lru_cache.
+_MODEL_CACHE = LRUCache(maxsize=256)
+# Пази _MODEL_CACHE и _MODEL_LOAD_LOCKS; не се държи по време на joblib.load.
+_MODEL_CACHE_LOCK = Lock()
+# Заключване по tag, за да не се зарежда един и същ модел паралелно.
+_MODEL_LOAD_LOCKS = {}
 
 
 def _resolve_model_dir() -> str:
@@ -23,12 +32,34 @@ def _resolve_model_dir() -> str:
 
 MODEL_DIR = _resolve_model_dir()
 
+
 def load_model(tag: str):
     """
     Зарежда модел за машинно обучение по даден tag.
     Ако моделът с име {tag}_model.pkl (или tag, ако вече има разширение .pkl) не е намерен,
     се използва модел с име "P0063H01_E001_model.pkl".
+    Успешно зареденият модел се кешира по tag; None (неуспешно зареждане) не се кешира.
     """
+    with _MODEL_CACHE_LOCK:
+        model = _MODEL_CACHE.get(tag)
+        if model is not None:
+            return model
+        load_lock = _MODEL_LOAD_LOCKS.setdefault(tag, Lock())
+
+    with load_lock:
+        with _MODEL_CACHE_LOCK:
+            model = _MODEL_CACHE.get(tag)
+        if model is not None:
+            return model
+        model = _load_model_uncached(tag)
+        if model is not None:
+            with _MODEL_CACHE_LOCK:
+                _MODEL_CACHE[tag] = model
+                _MODEL_LOAD_LOCKS.pop(tag, None)
+    return model
+
+
+def _load_model_uncached(tag: str):
     if tag.endswith(".pkl"):
         model_file = tag
     else:
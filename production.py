@@ -1,6 +1,8 @@
 import math
 from datetime import datetime
 
+import numpy as np
+
 def production_correction(temp_c: float, cloud_cover: float) -> float:
     """
     Изчислява коригиращ коефициент, отчитащ влиянието на температурата и облачността.
@@ -70,3 +72,25 @@ def calculate_system_production(
     
     production = production_without_losses * string_loss_factor * inverter_efficiency
     return production
+
+
+def calculate_system_production_array(
+    panel_power: np.ndarray,
+    temp_c: np.ndarray,
+    cloud_cover: np.ndarray,
+    num_panels: int,
+    string_loss_factor: float = 0.98,
+    inverter_efficiency: float = 0.95
+) -> np.ndarray:
+    """
+    Векторизиран вариант на calculate_system_production за масиви от стойности (по една за всеки момент).
+    Формулата и редът на операциите са същите, така че резултатите съвпадат с поелементното изчисление.
+    """
+    temp_coeff = -0.0044
+    temp_diff = temp_c - 25
+    f_temp = 1 + temp_coeff * temp_diff + 0.0001 * (temp_diff ** 2)
+    k = 1.0
+    f_cloud = np.exp(-k * cloud_cover)
+    correction = f_temp * f_cloud
+    production_without_losses = panel_power * correction * num_panels
+    return production_without_losses * string_loss_factor * inverter_efficiency
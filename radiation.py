@@ -53,3 +53,46 @@ def calculate_panel_irradiance(latitude: float, longitude: float, dt, panel_tilt
     except Exception as e:
         print("Грешка в calculate_panel_irradiance:", e)
         return 0.0
+
+
+def calculate_panel_irradiance_series(latitude: float, longitude: float, times, panel_tilt: float, panel_azimuth: float, tz: str = "Europe/Nicosia") -> np.ndarray:
+    """
+    Векторизиран вариант на calculate_panel_irradiance: изчислява POA (W/m²) за всички моменти
+    от times с едно извикване на pvlib.
+    За моменти, в които слънцето е под хоризонта или локалното време е невалидно (преход към/от лятно часово време),
+    стойността е 0 — както при calculate_panel_irradiance.
+    """
+    result = np.zeros(len(times), dtype=float)
+    try:
+        if panel_azimuth is None:
+            panel_azimuth = 180.0
+
+        time_index = pd.DatetimeIndex(times)
+        if time_index.tz is None:
+            time_index = time_index.tz_localize(tz, ambiguous="NaT", nonexistent="NaT")
+        valid = ~time_index.isna()
+        if not valid.any():
+            return result
+        time_index = time_index[valid]
+
+        site = Location(latitude, longitude, tz=tz)
+        solpos = site.get_solarposition(time_index)
+        clearsky = site.get_clearsky(time_index)
+
+        poa_irradiance = pvlib.irradiance.get_total_irradiance(
+            surface_tilt=panel_tilt,
+            surface_azimuth=panel_azimuth,
+            solar_zenith=solpos['zenith'].values,
+            solar_azimuth=solpos['azimuth'].values,
+            dni=clearsky['dni'].values,
+            ghi=clearsky['ghi'].values,
+            dhi=clearsky['dhi'].values
+        )['poa_global']
+
+        values = np.nan_to_num(np.asarray(poa_irradiance, dtype=float), nan=0.0)
+        values[solpos['apparent_zenith'].values >= 90] = 0.0
+        result[valid] = values
+        return result
+    except Exception as e:
+        print("Грешка в calculate_panel_irradiance_series:", e)
+        return np.zeros(len(times), dtype=float)
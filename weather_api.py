@@ -1,24 +1,51 @@
 import requests
 from datetime import date
+from threading import Lock
+
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from config import load_settings
 
 settings = load_settings()
 WEATHER_API_URL = "http://api.weatherapi.com/v1/forecast.json"
 
+# Sibling topics at one site ask for the same coordinates/date within one refresh cycle. The TTL is half the
+# refresh interval so entries from the previous run_future cycle have always expired when the next one starts.
+FORECAST_CACHE_TTL_SECONDS = max(60, settings.forecast_refresh_minutes * 60 // 2)
+_forecast_cache: TTLCache = TTLCache(maxsize=4096, ttl=FORECAST_CACHE_TTL_SECONDS)
+_forecast_cache_lock = Lock()
+
+# Shared keep-alive session: forecast calls reuse pooled TCP connections instead of reconnecting each time.
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=("GET",)),
+)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
 
 def get_forecast_by_coords(lat: float, lon: float, forecast_date: date):
+    cache_key = (round(lat, 3), round(lon, 3), forecast_date)
+    with _forecast_cache_lock:
+        cached = _forecast_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     params = {
         "key": settings.weather_api_key,
         "q": f"{lat},{lon}",
         "dt": forecast_date.strftime("%Y-%m-%d"),
     }
     try:
-        resp = requests.get(WEATHER_API_URL, params=params, timeout=10)
+        resp = _session.get(WEATHER_API_URL, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         hours = data["forecast"]["forecastday"][0]["hour"]
-        return [
+        records = [
             {
                 "time": item["time"],
                 "temp_c": item.get("temp_c"),
@@ -28,3 +55,8 @@ def get_forecast_by_coords(lat: float, lon: float, forecast_date: date):
         ]
     except Exception:
         return []
+
+    if records:
+        with _forecast_cache_lock:
+            _forecast_cache[cache_key] = records
+    return records
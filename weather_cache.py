@@ -0,0 +1,86 @@
+"""Persistent local cache for archive weather of completed days.
+
+Enabled by WEATHER_CACHE_PATH (an SQLite file). Archive weather for a day that ended more than a day ago
+no longer changes, so those records are kept on disk and later reads skip the remote archive DB.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+from config import load_settings
+
+logger = logging.getLogger(__name__)
+
+settings = load_settings()
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_weather (
+    source TEXT NOT NULL,
+    user_object_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    records TEXT NOT NULL,
+    PRIMARY KEY (source, user_object_id, day)
+)
+"""
+
+
+def _connection() -> sqlite3.Connection | None:
+    if not settings.weather_cache_path:
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(settings.weather_cache_path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _day_key(day) -> str:
+    return day.isoformat() if isinstance(day, date) else str(day)[:10]
+
+
+def is_immutable_day(day) -> bool:
+    """True for days strictly before yesterday (UTC); yesterday's archive may still be filling in."""
+    if not settings.weather_cache_path:
+        return False
+    try:
+        value = date.fromisoformat(_day_key(day))
+    except ValueError:
+        return False
+    return value < datetime.now(timezone.utc).date() - timedelta(days=1)
+
+
+def get(source: str, user_object_id, day) -> list[dict] | None:
+    try:
+        conn = _connection()
+        if conn is None:
+            return None
+        row = conn.execute(
+            "SELECT records FROM archive_weather WHERE source = ? AND user_object_id = ? AND day = ?",
+            (source, int(user_object_id), _day_key(day)),
+        ).fetchone()
+    except Exception as exc:
+        logger.warning("[weather_cache] read failed: %s", exc)
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def put(source: str, user_object_id, day, records: list[dict]) -> None:
+    try:
+        conn = _connection()
+        if conn is None:
+            return
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO archive_weather (source, user_object_id, day, records) VALUES (?, ?, ?, ?)",
+                (source, int(user_object_id), _day_key(day), json.dumps(records)),
+            )
+    except Exception as exc:
+        logger.warning("[weather_cache] write failed: %s", exc)
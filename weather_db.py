@@ -1,17 +1,21 @@
 import logging
+from datetime import date, timedelta
+from operator import attrgetter
 
 import javaobj
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, text
 
-from config import load_settings
+import weather_cache
+from config import engine_options, load_settings
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 settings = load_settings()
-engine = create_engine(settings.solar_db_dsn, pool_pre_ping=True)
-engine_weather_main = create_engine(settings.weather_db_dsn, pool_pre_ping=True)
+engine = create_engine(settings.solar_db_dsn, **engine_options(settings))
+engine_weather_main = create_engine(settings.weather_db_dsn, **engine_options(settings))
 
 _user_object_cache: dict[str, int] = {}
 
@@ -47,7 +51,22 @@ def unwrap_value(obj):
     return getattr(obj, "value", obj)
 
 
-def extract_forecast_data(forecast_obj):
+def _to_float(value) -> float:
+    """Numeric coercion with NaN for missing/invalid values (same result as pd.to_numeric(errors="coerce"))."""
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# Fast path for the common payload shape; records missing a field fall back to getattr with defaults.
+_hour_fields = attrgetter("time", "temp_c", "cloud")
+
+
+def extract_forecast_data(forecast_obj) -> tuple[list[str], list[float], list[float]]:
+    """Return parallel (times, temps, clouds) columns for every hour record in the forecast."""
     days = getattr(forecast_obj, "forecastday", None)
     if days is None:
         raise WeatherArchiveError("java_object_parse", "В Java-объекте отсутствует forecastday")
@@ -60,7 +79,9 @@ def extract_forecast_data(forecast_obj):
             original_exception=exc,
         ) from exc
 
-    data = []
+    times: list[str] = []
+    temps: list[float] = []
+    clouds: list[float] = []
     for day in days:
         hours = getattr(day, "hour", None)
         if hours is None:
@@ -74,41 +95,73 @@ def extract_forecast_data(forecast_obj):
                 original_exception=exc,
             ) from exc
         for hour in hours:
-            rec_time = unwrap_value(getattr(hour, "time", None))
+            try:
+                time_raw, temp_raw, cloud_raw = _hour_fields(hour)
+            except AttributeError:
+                time_raw = getattr(hour, "time", None)
+                temp_raw = getattr(hour, "temp_c", None)
+                cloud_raw = getattr(hour, "cloud", None)
+
+            rec_time = unwrap_value(time_raw)
             if rec_time is None:
                 continue
 
             # Java payloads may expose camelCase fields and wrapper objects.
-            temp_raw = getattr(hour, "temp_c", None)
             if temp_raw is None:
                 temp_raw = getattr(hour, "tempC", None)
 
-            cloud_raw = getattr(hour, "cloud", None)
+            times.append(str(rec_time))
+            temps.append(_to_float(unwrap_value(temp_raw)))
+            clouds.append(_to_float(unwrap_value(cloud_raw)))
+    return times, temps, clouds
 
-            data.append({
-                "time": str(rec_time),
-                "temp_c": unwrap_value(temp_raw),
-                "cloud": unwrap_value(cloud_raw),
-            })
-    return data
+
+# Range on the raw column (not date::date) so (user_object_id, date) indexes can answer hits and misses alike.
+_WEATHER_BLOB_QUERY = text(
+    """
+    SELECT current_data
+    FROM weather_data
+    WHERE user_object_id = :user_object_id
+      AND date >= CAST(:prediction_date AS date)
+      AND date < CAST(:prediction_date AS date) + 1
+    ORDER BY date ASC
+    LIMIT 1
+    """
+)
+# First blob of every day in [start_day, end_day); DISTINCT ON keeps the same "earliest row per day" rule.
+_WEATHER_BLOBS_RANGE_QUERY = text(
+    """
+    SELECT DISTINCT ON (date::date) date::date AS day, current_data
+    FROM weather_data
+    WHERE user_object_id = :user_object_id
+      AND date >= :start_day
+      AND date < :end_day
+    ORDER BY date::date, date ASC
+    """
+)
+# Upper bound on the calendar span of one range query, so sparse day lists don't pull a year of blobs at once.
+_RANGE_QUERY_MAX_DAYS = 31
+_USER_OBJECT_QUERY = text("SELECT id FROM user_objects WHERE replicator_id = :replicator_id LIMIT 1")
 
 
 def _fetch_and_parse_weather(db_engine, user_object_id, prediction_date, source_label: str) -> list[dict]:
     """SQL query + Java deserialization. Works with any engine."""
-    query = text(
-        """
-        SELECT current_data
-        FROM weather_data
-        WHERE user_object_id = :user_object_id
-          AND date::date = :prediction_date
-        ORDER BY date ASC
-        LIMIT 1
-        """
-    )
+    cacheable = weather_cache.is_immutable_day(prediction_date)
+    if cacheable:
+        cached = weather_cache.get(source_label, user_object_id, prediction_date)
+        if cached is not None:
+            return cached
 
+    records = _query_and_parse_weather(db_engine, user_object_id, prediction_date, source_label)
+    if cacheable and records:
+        weather_cache.put(source_label, user_object_id, prediction_date, records)
+    return records
+
+
+def _query_and_parse_weather(db_engine, user_object_id, prediction_date, source_label: str) -> list[dict]:
     try:
         with db_engine.connect() as conn:
-            result = conn.execute(query, {"user_object_id": user_object_id, "prediction_date": prediction_date}).fetchone()
+            result = conn.execute(_WEATHER_BLOB_QUERY, {"user_object_id": user_object_id, "prediction_date": prediction_date}).fetchone()
     except Exception as exc:
         raise WeatherArchiveError(
             "postgres_query",
@@ -119,7 +172,11 @@ def _fetch_and_parse_weather(db_engine, user_object_id, prediction_date, source_
     if not result:
         return []
 
-    current_data = deserialize_java_object(result[0])
+    return _parse_weather_blob(result[0], source_label)
+
+
+def _parse_weather_blob(blob, source_label: str) -> list[dict]:
+    current_data = deserialize_java_object(blob)
     if current_data is None:
         return []
 
@@ -127,17 +184,107 @@ def _fetch_and_parse_weather(db_engine, user_object_id, prediction_date, source_
     if forecast_obj is None:
         raise WeatherArchiveError("java_object_parse", f"В Java-объекте отсутствует поле forecast ({source_label})")
 
-    data = extract_forecast_data(forecast_obj)
-    if not data:
+    times, temps, clouds = extract_forecast_data(forecast_obj)
+    if not times:
         return []
 
-    return _process_weather_dataframe(pd.DataFrame(data), source_label)
+    return _process_weather_columns(times, temps, clouds, source_label)
+
+
+def _day_windows(days: list[date]) -> list[tuple[date, date]]:
+    """Split sorted days into [start, end) windows spanning at most _RANGE_QUERY_MAX_DAYS."""
+    windows: list[tuple[date, date]] = []
+    for day in days:
+        if windows and day < windows[-1][0] + timedelta(days=_RANGE_QUERY_MAX_DAYS):
+            windows[-1] = (windows[-1][0], day + timedelta(days=1))
+        else:
+            windows.append((day, day + timedelta(days=1)))
+    return windows
+
+
+def _fetch_and_parse_weather_days(
+    db_engine,
+    user_object_id,
+    days: list[date],
+    source_label: str,
+) -> dict[date, list[dict] | WeatherArchiveError]:
+    """Bulk _fetch_and_parse_weather: one range query per window of days instead of one query per day.
+
+    Every requested day gets either its records ([] when there is no row) or the WeatherArchiveError
+    the single-day call would have raised.
+    """
+    results: dict[date, list[dict] | WeatherArchiveError] = {}
+    wanted: list[date] = []
+    for day in sorted(set(days)):
+        cached = weather_cache.get(source_label, user_object_id, day) if weather_cache.is_immutable_day(day) else None
+        if cached is not None:
+            results[day] = cached
+        else:
+            wanted.append(day)
+
+    for start_day, end_day in _day_windows(wanted):
+        try:
+            with db_engine.connect() as conn:
+                rows = conn.execute(
+                    _WEATHER_BLOBS_RANGE_QUERY,
+                    {"user_object_id": user_object_id, "start_day": start_day, "end_day": end_day},
+                ).all()
+        except Exception as exc:
+            error = WeatherArchiveError(
+                "postgres_query",
+                f"Ошибка чтения weather_data из PostgreSQL ({source_label}): {exc}",
+                original_exception=exc,
+            )
+            for day in wanted:
+                if start_day <= day < end_day:
+                    results[day] = error
+            continue
+
+        blobs = {row[0]: row[1] for row in rows}
+        for day in wanted:
+            if not start_day <= day < end_day:
+                continue
+            if day not in blobs:
+                results[day] = []
+                continue
+            try:
+                records = _parse_weather_blob(blobs[day], source_label)
+            except WeatherArchiveError as exc:
+                results[day] = exc
+                continue
+            results[day] = records
+            if records and weather_cache.is_immutable_day(day):
+                weather_cache.put(source_label, user_object_id, day, records)
+    return results
 
 
-def _process_weather_dataframe(df: pd.DataFrame, source_label: str) -> list[dict]:
+_STEP_15MIN_NS = 15 * 60 * 1_000_000_000
+
+
+def _interpolate_15min(x: np.ndarray, xp: np.ndarray, yp: np.ndarray) -> np.ndarray:
+    """Linear interpolation onto the 15-minute grid x, skipping NaN samples of yp.
+
+    Matches resample("15min").interpolate(): leading gaps stay NaN, trailing gaps repeat the last value.
+    """
+    valid = ~np.isnan(yp)
+    if not valid.any():
+        return np.full(len(x), np.nan)
+    return np.interp(x, xp[valid], yp[valid], left=np.nan)
+
+
+def _mean_by_timestamp(values: np.ndarray, inverse: np.ndarray, size: int) -> np.ndarray:
+    """NaN-skipping mean of values grouped by unique timestamp (same as groupby(level=0).mean())."""
+    present = ~np.isnan(values)
+    sums = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=size)
+    counts = np.bincount(inverse, weights=present.astype(np.float64), minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def _process_weather_columns(times: list[str], temps: list[float], clouds: list[float], source_label: str) -> list[dict]:
     """Parse time, resample to 15min, validate. Common for both DB paths."""
     try:
-        df["time"] = pd.to_datetime(df["time"], format="%Y-%m-%d %H:%M")
+        index = pd.to_datetime(times, format="%Y-%m-%d %H:%M", cache=True)
     except Exception as exc:
         raise WeatherArchiveError(
             "weather_timeseries_parse",
@@ -145,48 +292,50 @@ def _process_weather_dataframe(df: pd.DataFrame, source_label: str) -> list[dict
             original_exception=exc,
         ) from exc
 
-    if "temp_c" not in df.columns or "cloud" not in df.columns:
-        raise WeatherArchiveError(
-            "weather_fields_missing",
-            f"В исторической погоде отсутствуют ожидаемые поля temp_c/cloud ({source_label})",
-        )
-
-    df["temp_c"] = pd.to_numeric(df["temp_c"], errors="coerce")
-    df["cloud"] = pd.to_numeric(df["cloud"], errors="coerce")
+    ts = np.asarray(index.as_unit("ns").asi8)
+    temp = np.fromiter(temps, dtype=np.float64, count=len(temps))
+    cloud = np.fromiter(clouds, dtype=np.float64, count=len(clouds))
 
-    if df[["temp_c", "cloud"]].notna().sum().sum() == 0:
+    if np.isnan(temp).all() and np.isnan(cloud).all():
         raise WeatherArchiveError(
             "weather_values_empty",
             f"Историческая погода прочитана, но temp_c и cloud пустые во всех исходных точках ({source_label})",
         )
 
-    df.set_index("time", inplace=True)
-    df.sort_index(inplace=True)
-    if df.index.has_duplicates:
+    unique_ts, inverse = np.unique(ts, return_inverse=True)
+    if len(unique_ts) < len(ts):
         logger.warning("[%s] Duplicate timestamps detected; aggregating before resample.", source_label)
-        df = df.groupby(level=0).mean(numeric_only=True)
-
-    numeric_cols = df.select_dtypes(include="number").columns
-    if numeric_cols.empty:
-        return []
-
-    df_15min = (
-        df[numeric_cols]
-        .resample("15min")
-        .interpolate(method="linear")
-        .reset_index()
-    )
-    if "cloud" in df_15min.columns:
-        df_15min["cloud"] = df_15min["cloud"].round().astype("Int64")
-
-    if df_15min[["temp_c", "cloud"]].notna().sum().sum() == 0:
+        temp = _mean_by_timestamp(temp, inverse, len(unique_ts))
+        cloud = _mean_by_timestamp(cloud, inverse, len(unique_ts))
+    else:
+        order = np.argsort(ts, kind="stable")
+        temp = temp[order]
+        cloud = cloud[order]
+
+    start = unique_ts[0] - unique_ts[0] % _STEP_15MIN_NS
+    grid = np.arange(start, unique_ts[-1] + 1, _STEP_15MIN_NS, dtype=np.int64)
+    # Offsets from the grid start stay small enough to be exact in float64, unlike absolute epoch nanoseconds.
+    x = (grid - start).astype(np.float64)
+    xp = (unique_ts - start).astype(np.float64)
+    temp_15 = _interpolate_15min(x, xp, temp)
+    cloud_15 = np.rint(_interpolate_15min(x, xp, cloud))
+
+    temp_missing = np.isnan(temp_15)
+    cloud_missing = np.isnan(cloud_15)
+    if temp_missing.all() and cloud_missing.all():
         raise WeatherArchiveError(
             "weather_values_empty_after_resample",
             f"После ресемплинга историческая погода содержит только пустые temp_c/cloud ({source_label})",
         )
 
-    df_15min["time"] = df_15min["time"].dt.strftime("%Y-%m-%d %H:%M")
-    return df_15min.to_dict(orient="records")
+    time_labels = pd.to_datetime(grid, unit="ns").strftime("%Y-%m-%d %H:%M")
+    cloud_values = np.where(cloud_missing, 0, cloud_15).astype(np.int64).tolist()
+    return [
+        {"time": label, "temp_c": temp_value, "cloud": None if missing else cloud_value}
+        for label, temp_value, cloud_value, missing in zip(
+            time_labels, temp_15.tolist(), cloud_values, cloud_missing.tolist()
+        )
+    ]
 
 
 def extract_weather_from_db(user_object_id, prediction_date):
@@ -194,6 +343,11 @@ def extract_weather_from_db(user_object_id, prediction_date):
     return _fetch_and_parse_weather(engine, user_object_id, prediction_date, "solar_db")
 
 
+def extract_weather_days_from_db(user_object_id, days: list[date]) -> dict[date, list[dict] | WeatherArchiveError]:
+    """Bulk extract_weather_from_db for several days of one object."""
+    return _fetch_and_parse_weather_days(engine, user_object_id, days, "solar_db")
+
+
 def resolve_user_object_id(replicator_id: str) -> int | None:
     """Lookup user_object_id by replicator_id in weather_main2."""
     if replicator_id in _user_object_cache:
@@ -201,10 +355,9 @@ def resolve_user_object_id(replicator_id: str) -> int | None:
         logger.info("[weather] resolved replicator_id=%s -> user_object_id=%s (cached)", replicator_id, cached)
         return cached
 
-    query = text("SELECT id FROM user_objects WHERE replicator_id = :replicator_id LIMIT 1")
     try:
         with engine_weather_main.connect() as conn:
-            row = conn.execute(query, {"replicator_id": replicator_id}).fetchone()
+            row = conn.execute(_USER_OBJECT_QUERY, {"replicator_id": replicator_id}).fetchone()
     except Exception as exc:
         logger.warning("[weather] failed to resolve replicator_id=%s: %s", replicator_id, exc)
         return None
@@ -233,3 +386,15 @@ def get_weather_by_replicator_id(replicator_id: str, prediction_date) -> list[di
             f"Не удалось определить user_object_id для replicator_id={replicator_id}",
         )
     return extract_weather_from_new_db(uid, prediction_date)
+
+
+def get_weather_days_by_replicator_id(replicator_id: str, days: list[date]) -> dict[date, list[dict] | WeatherArchiveError]:
+    """Bulk get_weather_by_replicator_id for several days of one object."""
+    uid = resolve_user_object_id(replicator_id)
+    if uid is None:
+        error = WeatherArchiveError(
+            "replicator_id_lookup",
+            f"Не удалось определить user_object_id для replicator_id={replicator_id}",
+        )
+        return {day: error for day in days}
+    return _fetch_and_parse_weather_days(engine_weather_main, uid, days, "weather_main2")
@@ -1,27 +1,101 @@
 from __future__ import annotations
 
 import logging
-from datetime import date, datetime
-from typing import Literal, TypedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from threading import Lock
+from typing import Callable, Literal, NamedTuple
 
-from weather_api import get_forecast_by_coords
-from weather_db import WeatherArchiveError, extract_weather_from_db, get_weather_by_replicator_id
+from cachetools import TTLCache
+
+from weather_api import FORECAST_CACHE_TTL_SECONDS, get_forecast_by_coords
+from weather_db import (
+    WeatherArchiveError,
+    extract_weather_days_from_db,
+    extract_weather_from_db,
+    get_weather_by_replicator_id,
+    get_weather_days_by_replicator_id,
+)
 
 logger = logging.getLogger(__name__)
 
+# Archive weather for days before yesterday does not change. Forecasts, yesterday (its archive may still be filling
+# in, same rule as weather_cache.is_immutable_day) and API fallbacks for past days use the short tier.
+_hist_cache: TTLCache = TTLCache(maxsize=4096, ttl=86400)
+_forecast_cache: TTLCache = TTLCache(maxsize=1024, ttl=FORECAST_CACHE_TTL_SECONDS)
+_cache_lock = Lock()
+# Single-flight: concurrent callers for the same key wait on the first caller's fetch instead of repeating it.
+_inflight: dict[tuple, Future] = {}
+
 
-class WeatherFetchResult(TypedDict):
+@dataclass(frozen=True, slots=True)
+class WeatherFetchResult:
     records: list[dict]
     source: Literal["archive_db_new", "archive_db", "weather_api", "none"]
     status: Literal["ok", "no_data"]
     diagnostics: dict[str, str] | None
 
 
+class _WeatherQuery(NamedTuple):
+    replicator_id: str | None
+    user_object_id: int
+    latitude: float
+    longitude: float
+    prediction_date: date
+    date_str: str
+
+
+def _load_archive_new(query: _WeatherQuery) -> list[dict]:
+    return get_weather_by_replicator_id(query.replicator_id, query.date_str)
+
+
+def _load_archive(query: _WeatherQuery) -> list[dict]:
+    return extract_weather_from_db(query.user_object_id, query.date_str)
+
+
+def _load_weather_api(query: _WeatherQuery) -> list[dict]:
+    return get_forecast_by_coords(query.latitude, query.longitude, query.prediction_date)
+
+
+_SOURCES: dict[str, Callable[[_WeatherQuery], list[dict]]] = {
+    "archive_db_new": _load_archive_new,
+    "archive_db": _load_archive,
+    "weather_api": _load_weather_api,
+}
+# Historical: new DB first, then old DB, then API. Future: API first, then new DB, then old DB.
+# archive_db_new is skipped when the topic has no replicator_id.
+_HISTORICAL_ORDER = ("archive_db_new", "archive_db", "weather_api")
+_FUTURE_ORDER = ("weather_api", "archive_db_new", "archive_db")
+
+
 def _weather_non_null_points(records: list[dict]) -> int:
     """Count points where at least one core weather field is present."""
     return sum(1 for rec in records if rec.get("temp_c") is not None or rec.get("cloud") is not None)
 
 
+def _finalize_diagnostics(diagnostics: dict[str, str | int]) -> dict[str, str] | None:
+    """Counts are kept as ints while sources are tried; the result carries strings only."""
+    if not diagnostics:
+        return None
+    return {key: str(value) for key, value in diagnostics.items()}
+
+
+def _has_non_null_weather(records: list[dict]) -> bool:
+    """Same test as _weather_non_null_points(records) > 0, but stops at the first usable point."""
+    return any(rec.get("temp_c") is not None or rec.get("cloud") is not None for rec in records)
+
+
+def _preloaded_loader(value: list[dict] | WeatherArchiveError):
+    def loader() -> list[dict]:
+        if isinstance(value, WeatherArchiveError):
+            raise value
+        return value
+
+    return loader
+
+
 def get_weather_for_date(
     *,
     replicator_id: str | None = None,
@@ -29,10 +103,132 @@ def get_weather_for_date(
     latitude: float,
     longitude: float,
     prediction_date: date,
+    today: date | None = None,
 ) -> WeatherFetchResult:
-    today = datetime.utcnow().date()
+    """Weather records for one day from the first source that has usable data.
+
+    Batch callers should pass ``today`` (UTC) once instead of having every call read the clock.
+    """
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+    return _get_weather_cached(replicator_id, user_object_id, latitude, longitude, prediction_date, today)
+
+
+def get_weather_for_dates(
+    *,
+    replicator_id: str | None = None,
+    user_object_id: int,
+    latitude: float,
+    longitude: float,
+    prediction_dates: list[date],
+    today: date | None = None,
+) -> dict[date, WeatherFetchResult]:
+    """get_weather_for_date for many days of one location.
+
+    Past days that are not cached are read from the archive DBs with one range query per month-sized
+    window instead of one query per day; source order and fallbacks per day are the same as for a single day.
+    """
+    if today is None:
+        today = datetime.now(timezone.utc).date()
 
-    diagnostics: dict[str, str] = {}
+    uncached_past: list[date] = []
+    with _cache_lock:
+        for day in dict.fromkeys(prediction_dates):
+            key = _cache_key(replicator_id, user_object_id, latitude, longitude, day)
+            if day < today and key not in _hist_cache and key not in _forecast_cache:
+                uncached_past.append(day)
+
+    preloaded: dict[date, dict[str, list[dict] | WeatherArchiveError]] = {day: {} for day in uncached_past}
+    if uncached_past:
+        fallback_days = uncached_past
+        if replicator_id is not None:
+            new_db = get_weather_days_by_replicator_id(replicator_id, uncached_past)
+            for day, value in new_db.items():
+                preloaded[day]["archive_db_new"] = value
+            # The old archive is only consulted for days the new one could not serve.
+            fallback_days = [
+                day
+                for day in uncached_past
+                if isinstance(new_db.get(day), WeatherArchiveError) or not _has_non_null_weather(new_db.get(day) or [])
+            ]
+        if fallback_days:
+            for day, value in extract_weather_days_from_db(user_object_id, fallback_days).items():
+                preloaded[day]["archive_db"] = value
+
+    return {
+        day: _get_weather_cached(
+            replicator_id, user_object_id, latitude, longitude, day, today, preloaded=preloaded.get(day)
+        )
+        for day in dict.fromkeys(prediction_dates)
+    }
+
+
+def _cache_key(replicator_id, user_object_id, latitude: float, longitude: float, prediction_date: date) -> tuple:
+    return (replicator_id, user_object_id, round(latitude, 3), round(longitude, 3), prediction_date)
+
+
+def _get_weather_cached(
+    replicator_id: str | None,
+    user_object_id: int,
+    latitude: float,
+    longitude: float,
+    prediction_date: date,
+    today: date,
+    preloaded: dict[str, list[dict] | WeatherArchiveError] | None = None,
+) -> WeatherFetchResult:
+    key = _cache_key(replicator_id, user_object_id, latitude, longitude, prediction_date)
+
+    with _cache_lock:
+        cached = _hist_cache.get(key) or _forecast_cache.get(key)
+        if cached is not None:
+            return cached
+        inflight = _inflight.get(key)
+        if inflight is None:
+            inflight = _inflight[key] = Future()
+            owner = True
+        else:
+            owner = False
+
+    if not owner:
+        return inflight.result()
+
+    try:
+        result = _fetch_weather_for_date(
+            replicator_id=replicator_id,
+            user_object_id=user_object_id,
+            latitude=latitude,
+            longitude=longitude,
+            prediction_date=prediction_date,
+            today=today,
+            preloaded=preloaded,
+        )
+    except BaseException as exc:
+        with _cache_lock:
+            _inflight.pop(key, None)
+        inflight.set_exception(exc)
+        raise
+
+    with _cache_lock:
+        if result.status == "ok":
+            settled = prediction_date < today - timedelta(days=1) and result.source != "weather_api"
+            cache = _hist_cache if settled else _forecast_cache
+            cache[key] = result
+        _inflight.pop(key, None)
+    inflight.set_result(result)
+    return result
+
+
+def _fetch_weather_for_date(
+    *,
+    replicator_id: str | None,
+    user_object_id: int,
+    latitude: float,
+    longitude: float,
+    prediction_date: date,
+    today: date,
+    preloaded: dict[str, list[dict] | WeatherArchiveError] | None = None,
+) -> WeatherFetchResult:
+    diagnostics: dict[str, str | int] = {}
 
     logger.info(
         "[weather] date=%s replicator_id=%s user_object_id=%s",
@@ -43,13 +239,11 @@ def get_weather_for_date(
         try:
             recs = loader() or []
         except WeatherArchiveError as exc:
-            diagnostics[f"{source}_stage"] = exc.stage
-            diagnostics[f"{source}_error"] = str(exc)
+            diagnostics.update({f"{source}_stage": exc.stage, f"{source}_error": str(exc)})
             logger.warning("[weather] %s failed at stage=%s: %s", source, exc.stage, exc)
             return []
         except Exception as exc:
-            diagnostics[f"{source}_stage"] = "unexpected"
-            diagnostics[f"{source}_error"] = str(exc)
+            diagnostics.update({f"{source}_stage": "unexpected", f"{source}_error": str(exc)})
             logger.warning("[weather] %s failed unexpectedly: %s", source, exc)
             return []
         if recs:
@@ -59,39 +253,42 @@ def get_weather_for_date(
         return recs
 
     def _try_source(source: str, records: list[dict]) -> WeatherFetchResult | None:
-        non_null = _weather_non_null_points(records)
-        if records:
-            diagnostics[f"{source}_records"] = str(len(records))
-            diagnostics[f"{source}_non_null_points"] = str(non_null)
-        if records and non_null > 0:
-            return {"records": records, "source": source, "status": "ok", "diagnostics": diagnostics or None}
-        if records:
-            diagnostics[f"{source}_stage"] = "empty_weather_values"
-            diagnostics[f"{source}_error"] = "records are present, but temp_c/cloud are null for all points"
+        if not records:
+            return None
+        if _has_non_null_weather(records):
+            diagnostics.update({
+                f"{source}_records": len(records),
+                f"{source}_non_null_points": _weather_non_null_points(records),
+            })
+            return WeatherFetchResult(
+                records=records, source=source, status="ok", diagnostics=_finalize_diagnostics(diagnostics)
+            )
+        diagnostics.update({
+            f"{source}_records": len(records),
+            f"{source}_non_null_points": 0,
+            f"{source}_stage": "empty_weather_values",
+            f"{source}_error": "records are present, but temp_c/cloud are null for all points",
+        })
         return None
 
-    # Build ordered source list
-    sources: list[tuple[str, object]] = []
-
-    if prediction_date < today:
-        # Historical: new DB first, then old DB, then API
-        if replicator_id is not None:
-            sources.append(("archive_db_new", lambda: get_weather_by_replicator_id(replicator_id, prediction_date.strftime("%Y-%m-%d"))))
-        sources.append(("archive_db", lambda: extract_weather_from_db(user_object_id, prediction_date.strftime("%Y-%m-%d"))))
-        sources.append(("weather_api", lambda: get_forecast_by_coords(latitude, longitude, prediction_date)))
-    else:
-        # Future: API first, then new DB, then old DB
-        sources.append(("weather_api", lambda: get_forecast_by_coords(latitude, longitude, prediction_date)))
-        if replicator_id is not None:
-            sources.append(("archive_db_new", lambda: get_weather_by_replicator_id(replicator_id, prediction_date.strftime("%Y-%m-%d"))))
-        sources.append(("archive_db", lambda: extract_weather_from_db(user_object_id, prediction_date.strftime("%Y-%m-%d"))))
+    query = _WeatherQuery(replicator_id, user_object_id, latitude, longitude, prediction_date, prediction_date.isoformat())
+    order = _HISTORICAL_ORDER if prediction_date < today else _FUTURE_ORDER
+    preloaded = preloaded or {}
+    # Sources already read in bulk by get_weather_for_dates go through the same _load/_try_source path.
+    sources = [
+        (name, _preloaded_loader(preloaded[name]) if name in preloaded else partial(_SOURCES[name], query))
+        for name in order
+        if name != "archive_db_new" or replicator_id is not None
+    ]
 
     logger.info("[weather] sources=%s", [s[0] for s in sources])
 
+    # Sources are tried one after another: the primary source usually has the day, so reading the next one
+    # speculatively would mostly double the archive load for nothing.
     for source_name, loader in sources:
         records = _load(source_name, loader)
         result = _try_source(source_name, records)
         if result is not None:
             return result
 
-    return {"records": [], "source": "none", "status": "no_data", "diagnostics": diagnostics or None}
+    return WeatherFetchResult(records=[], source="none", status="no_data", diagnostics=_finalize_diagnostics(diagnostics))